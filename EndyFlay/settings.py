@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,6 +89,8 @@ REST_FRAMEWORK = {
     ],
 }
 
+TOKEN_REFRESH_INTERVAL = 3600
+
 LANGUAGE_CODE = 'ru'
 
 TIME_ZONE = 'Asia/Almaty'
@@ -97,5 +101,39 @@ USE_TZ = True
 
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+TTS_POOL_ENABLED = os.environ.get('TTS_POOL_ENABLED') == '1'
+TTS_POOL_INTERVAL = 0.05
+TTS_POOL_CONCURRENCY = 32
+TTS_POOL_TIMEOUT = 5
+TTS_DEBOUNCE_DELAY = 0.5
+
+VOICE_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+VOICE_ACCEL_REDIRECT_PREFIX = os.environ.get('VOICE_ACCEL_REDIRECT_PREFIX')
+VOICE_X_SENDFILE = os.environ.get('VOICE_X_SENDFILE') == '1'
+
+VOICE_S3_BUCKET = os.environ.get('VOICE_S3_BUCKET')
+VOICE_S3_ENDPOINT_URL = os.environ.get('VOICE_S3_ENDPOINT_URL')
+VOICE_S3_URL_EXPIRES = 300
+
+PIPER_VOICES = {
+    lang: path
+    for lang, path in (
+        ('en', os.environ.get('PIPER_VOICE_EN')),
+        ('ru', os.environ.get('PIPER_VOICE_RU')),
+    )
+    if path
+}
+PIPER_THREADS = 4
@@ -1,10 +1,11 @@
 from django.contrib import admin
 from .models import Text_to_speech
+from .tasks import enqueue_synthesis, schedule_synthesis
 
 
 @admin.register(Text_to_speech)
 class Text_to_speechAdmin(admin.ModelAdmin):
-    list_display = ("text", "file_name", "created_at", "updated_at")
+    list_display = ("text", "file_name", "ready", "created_at", "updated_at")
     search_fields = ("text", "file_name")
     list_filter = ("created_at", "updated_at")
     date_hierarchy = "created_at"
@@ -26,3 +27,15 @@ class Text_to_speechAdmin(admin.ModelAdmin):
         if obj:
             return ("file_name",) + self.readonly_fields
         return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            super().save_model(request, obj, form, change)
+            enqueue_synthesis(obj.text, obj.file_name, obj.pk)
+        elif "text" in form.changed_data:
+            # Как и при PUT через API: старый аудиофайл не соответствует новому тексту.
+            obj.ready = False
+            super().save_model(request, obj, form, change)
+            schedule_synthesis(obj.text, obj.file_name, obj.pk)
+        else:
+            super().save_model(request, obj, form, change)
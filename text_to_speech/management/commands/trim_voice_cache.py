@@ -0,0 +1,59 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from text_to_speech.models import Text_to_speech
+from text_to_speech.voice import VOICE_CACHE_DIR
+
+
+class Command(BaseCommand):
+    """
+    Команда trim_voice_cache удаляет давно не использованные аудиофайлы из кэша,
+    пока его размер не станет меньше заданного предела. Файлы, на которые
+    ссылаются записи без копии в S3, не удаляются.
+
+    Methods:
+        handle(*args, **options) -> None:
+            Вытесняет файлы кэша в порядке возрастания времени изменения.
+
+    """
+
+    help = "Очищает кэш аудиофайлов по принципу LRU."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-size",
+            type=int,
+            default=settings.VOICE_CACHE_MAX_SIZE,
+            help="Максимальный размер кэша в байтах.",
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(VOICE_CACHE_DIR):
+            return
+
+        in_use = set(
+            Text_to_speech.objects.filter(voice_key__isnull=True).values_list(
+                "voice", flat=True
+            )
+        )
+        entries = [
+            entry
+            for entry in os.scandir(VOICE_CACHE_DIR)
+            if entry.is_file() and entry.name.endswith(".mp3")
+        ]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+
+        removed = 0
+        for entry in entries:
+            if total <= options["max_size"]:
+                break
+            if os.path.join(VOICE_CACHE_DIR, entry.name) in in_use:
+                continue
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+            removed += 1
+
+        self.stdout.write(f"Удалено файлов из кэша: {removed}")
@@ -0,0 +1,128 @@
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.db import close_old_connections
+from django.core.management.base import BaseCommand
+
+from text_to_speech.tasks import (
+    POOL_KEY, DONE_CHANNEL, synthesize, drain_scheduled, retry_scheduled
+)
+
+
+PROCESSING_KEY = "tts:pool:processing"
+
+# Переносит все задачи из одного списка в другой за одну операцию.
+_MOVE_JOBS_SCRIPT = """
+local jobs = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1])
+for i = 1, #jobs, 1000 do
+    redis.call('RPUSH', KEYS[2], unpack(jobs, i, math.min(i + 999, #jobs)))
+end
+return jobs
+"""
+
+
+class Command(BaseCommand):
+    """
+    Команда tts_pool собирает ожидающие задачи синтеза из Redis пачками
+    и выполняет их параллельно в одном процессе. Она же обрабатывает
+    отложенные обновления записей.
+
+    Пока задача выполняется, она хранится в списке PROCESSING_KEY и при
+    перезапуске команды возвращается в пул. Задача с ошибкой синтеза
+    повторяется через отложенное обновление (retry_scheduled).
+    Рассчитана на один запущенный экземпляр на Redis.
+
+    Methods:
+        handle(*args, **options) -> None:
+            Запускает цикл обработки пула.
+
+    """
+
+    help = "Обрабатывает пул задач синтеза речи из Redis."
+
+    def handle(self, *args, **options):
+        asyncio.run(self.main())
+
+    async def main(self):
+        redis = aioredis.from_url(settings.REDIS_URL)
+        semaphore = asyncio.Semaphore(settings.TTS_POOL_CONCURRENCY)
+        running = set()
+        flushing = None
+
+        # Задачи, которые выполнялись при остановке прошлого запуска.
+        await redis.eval(_MOVE_JOBS_SCRIPT, 2, PROCESSING_KEY, POOL_KEY)
+
+        with ThreadPoolExecutor(max_workers=settings.TTS_POOL_CONCURRENCY) as pool:
+            loop = asyncio.get_running_loop()
+            while True:
+                for job in await self.drain(redis):
+                    task = asyncio.create_task(
+                        self.run_job(redis, pool, semaphore, job)
+                    )
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+
+                if flushing is None or flushing.done():
+                    if flushing is not None and flushing.exception():
+                        self.stderr.write(
+                            f"Ошибка отложенного синтеза: {flushing.exception()}"
+                        )
+                    flushing = loop.run_in_executor(pool, self.flush_scheduled)
+
+                await asyncio.sleep(settings.TTS_POOL_INTERVAL)
+
+    async def drain(self, redis):
+        """
+        Атомарно переносит все накопившиеся задачи из пула в список выполняемых.
+
+        Args:
+            redis (redis.asyncio.Redis): Асинхронный клиент Redis.
+
+        Returns:
+            list: Сериализованные задачи синтеза.
+
+        """
+        return await redis.eval(_MOVE_JOBS_SCRIPT, 2, POOL_KEY, PROCESSING_KEY)
+
+    async def run_job(self, redis, pool, semaphore, raw_job):
+        """
+        Выполняет одну задачу синтеза и публикует результат.
+
+        При ошибке задача ставится на повтор, пока не исчерпаны попытки.
+
+        Args:
+            redis (redis.asyncio.Redis): Асинхронный клиент Redis.
+            pool (ThreadPoolExecutor): Пул потоков для блокирующих вызовов gTTS.
+            semaphore (asyncio.Semaphore): Ограничение числа одновременных запросов.
+            raw_job (bytes): Сериализованные данные задачи: текст, имя файла и идентификатор записи.
+
+        """
+        loop = asyncio.get_running_loop()
+        job = json.loads(raw_job)
+        async with semaphore:
+            try:
+                voice_path = await loop.run_in_executor(pool, self.synthesize, job)
+            except Exception as e:
+                self.stderr.write(f"Ошибка синтеза {job['file_name']}: {e}")
+                await loop.run_in_executor(pool, retry_scheduled, job)
+            else:
+                await redis.publish(DONE_CHANNEL.format(pk=job["pk"]), voice_path)
+        await redis.lrem(PROCESSING_KEY, 1, raw_job)
+
+    def synthesize(self, job):
+        close_old_connections()
+        try:
+            return synthesize(job["text"], job["file_name"], job["pk"])
+        finally:
+            close_old_connections()
+
+    def flush_scheduled(self):
+        close_old_connections()
+        try:
+            return drain_scheduled()
+        finally:
+            close_old_connections()
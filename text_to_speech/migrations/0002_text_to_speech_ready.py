@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-15 22:06
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # До появления поля ready аудиофайл создавался синхронно при сохранении,
+    # поэтому все записи с voice уже можно скачивать.
+    Text_to_speech = apps.get_model('text_to_speech', 'Text_to_speech')
+    Text_to_speech.objects.filter(voice__isnull=False).update(ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_to_speech', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text_to_speech',
+            name='ready',
+            field=models.BooleanField(default=False, help_text='Аудиофайл сгенерирован и доступен для скачивания.', verbose_name='Готово'),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-15 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_to_speech', '0002_text_to_speech_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text_to_speech',
+            name='voice_key',
+            field=models.CharField(blank=True, help_text='Ключ аудиофайла в объектном хранилище S3.', max_length=400, null=True, verbose_name='Ключ в хранилище'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-15 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_to_speech', '0003_text_to_speech_voice_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='text_to_speech',
+            name='file_name',
+            field=models.CharField(help_text='Укажите имя аудиофайла.', max_length=64, unique=True, verbose_name='Имя файла'),
+        ),
+    ]
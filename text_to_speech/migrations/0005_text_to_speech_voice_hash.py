@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-15 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_to_speech', '0004_alter_text_to_speech_file_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text_to_speech',
+            name='voice_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 языка и текста, по которому сохранен аудиофайл.', max_length=64, null=True, verbose_name='Хэш голоса'),
+        ),
+    ]
@@ -1,7 +1,3 @@
-import io
-import re
-
-from gtts import gTTS
 from django.db import models
 
 
@@ -12,7 +8,7 @@ class Text_to_speech(models.Model):
         help_text="Введите текст, который вы хотите преобразовать в речь.",
     )
     file_name = models.CharField(
-        max_length=200,
+        max_length=64,
         unique=True,
         verbose_name="Имя файла",
         help_text="Укажите имя аудиофайла.",
@@ -25,6 +21,25 @@ class Text_to_speech(models.Model):
         verbose_name="Голос",
         help_text="Выберите голос для преобразования текста в речь.",
     )
+    voice_key = models.CharField(
+        max_length=400,
+        blank=True,
+        null=True,
+        verbose_name="Ключ в хранилище",
+        help_text="Ключ аудиофайла в объектном хранилище S3.",
+    )
+    voice_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        verbose_name="Хэш голоса",
+        help_text="SHA-256 языка и текста, по которому сохранен аудиофайл.",
+    )
+    ready = models.BooleanField(
+        default=False,
+        verbose_name="Готово",
+        help_text="Аудиофайл сгенерирован и доступен для скачивания.",
+    )
 
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -37,21 +52,6 @@ class Text_to_speech(models.Model):
         help_text="Дата и время последнего обновления записи.",
     )
 
-    def save(self, *args, **kwargs):
-        match = re.search(r"[\u0400-\u04ff]|[\u0500-\u052f]", self.text)
-        lang = "ru" if match else "en"
-        tts = gTTS(text=self.text, lang=lang)
-        voice_bytes = io.BytesIO()
-        tts.write_to_fp(voice_bytes)
-        voice_bytes.seek(0)
-
-        voice_path = f"voice/{self.file_name}.mp3"
-        self.voice = voice_path
-        with open(voice_path, "wb") as f:
-            f.write(voice_bytes.read())
-
-        return super().save(*args, **kwargs)
-
     def __str__(self):
         return self.file_name
 
@@ -0,0 +1,16 @@
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """
+    Возвращает общий для процесса клиент Redis.
+
+    Returns:
+        redis.Redis: Клиент Redis с пулом соединений.
+
+    """
+    return redis.Redis.from_url(settings.REDIS_URL)
@@ -5,10 +5,45 @@ from rest_framework import serializers
 from .models import Text_to_speech
 
 
+MIN_TEXT_LENGTH = 10
+MIN_FILE_NAME_LENGTH = 5
+MAX_TEXT_LENGTH = 700
+MAX_FILE_NAME_LENGTH = 20
+
+
 class TextToSpeechSerializer(serializers.ModelSerializer):
+    text = serializers.CharField(
+        min_length=MIN_TEXT_LENGTH,
+        max_length=MAX_TEXT_LENGTH,
+        error_messages={
+            "required": "Текст не может быть пустым.",
+            "blank": "Текст не может быть пустым.",
+            "min_length": "Текст не может быть меньше {min_length} символов.",
+            "max_length": "Текст не может быть больше {max_length} символов.",
+        },
+    )
+    file_name = serializers.CharField(
+        min_length=MIN_FILE_NAME_LENGTH,
+        max_length=MAX_FILE_NAME_LENGTH,
+        error_messages={
+            "required": "Имя файла не может быть пустым.",
+            "blank": "Имя файла не может быть пустым.",
+            "min_length": "Имя файла не может быть меньше {min_length} символов.",
+            "max_length": "Имя файла не может быть больше {max_length} символов.",
+        },
+    )
+
+    def validate_file_name(self, value):
+        if self.instance is not None and value != self.instance.file_name:
+            raise serializers.ValidationError(
+                "Имя файла нельзя изменить после создания записи."
+            )
+        return value
+
     class Meta:
         model = Text_to_speech
-        fields = ['text', 'file_name']
+        fields = ['text', 'file_name', 'ready']
+        read_only_fields = ['ready']
         
 
 class UserSerializer(serializers.ModelSerializer):
@@ -0,0 +1,70 @@
+from functools import lru_cache
+
+import boto3
+from botocore.exceptions import ClientError
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    Возвращает общий для процесса клиент S3 (или совместимого хранилища, например MinIO).
+
+    Returns:
+        botocore.client.S3: Клиент S3.
+
+    """
+    return boto3.client("s3", endpoint_url=settings.VOICE_S3_ENDPOINT_URL)
+
+
+def upload_voice(voice_path):
+    """
+    Загружает аудиофайл в объектное хранилище, если его там еще нет.
+
+    Ключ совпадает с путем в кэше, который зависит только от языка и текста,
+    поэтому уже загруженный объект не отличается от файла и повторно не
+    отправляется.
+
+    Args:
+        voice_path (str): Путь к аудиофайлу на диске.
+
+    Returns:
+        str: Ключ объекта в хранилище.
+
+    """
+    client = get_s3_client()
+    try:
+        client.head_object(Bucket=settings.VOICE_S3_BUCKET, Key=voice_path)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        client.upload_file(
+            voice_path,
+            settings.VOICE_S3_BUCKET,
+            voice_path,
+            ExtraArgs={"ContentType": "audio/mpeg"},
+        )
+    return voice_path
+
+
+def voice_url(voice_key, file_name):
+    """
+    Создает временную подписанную ссылку на скачивание аудиофайла.
+
+    Args:
+        voice_key (str): Ключ объекта в хранилище.
+        file_name (str): Имя файла аудиозаписи.
+
+    Returns:
+        str: Подписанная ссылка на аудиофайл.
+
+    """
+    return get_s3_client().generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": settings.VOICE_S3_BUCKET,
+            "Key": voice_key,
+            "ResponseContentDisposition": f'attachment; filename="{file_name}.mp3"',
+        },
+        ExpiresIn=settings.VOICE_S3_URL_EXPIRES,
+    )
@@ -0,0 +1,235 @@
+import json
+import time
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from EndyFlay.celery import celery_app
+
+from .models import Text_to_speech
+from .voice import write_voice
+from .storage import upload_voice
+from .redis_client import get_redis
+
+
+POOL_KEY = "tts:pool"
+DONE_CHANNEL = "tts:done:{pk}"
+SCHEDULE_KEY = "tts:sched"
+PENDING_KEY = "tts:pending:{pk}"
+PENDING_TIMEOUT = 300
+RETRY_DELAY = 10
+MAX_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(
+    autoretry_for=(Exception,),
+    retry_backoff=RETRY_DELAY,
+    retry_kwargs={"max_retries": MAX_ATTEMPTS - 1},
+)
+def synthesize(text, file_name, pk):
+    """
+    Создает аудиофайл на основе переданного текста и отмечает запись как готовую.
+
+    При ошибке (например, 429 от Google) задача повторяется с нарастающей
+    задержкой, всего не более MAX_ATTEMPTS попыток.
+
+    Результат не сохраняется, если текст записи успел измениться, чтобы
+    более старая задача не перезаписала озвучку нового текста.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+        file_name (str): Имя файла для аудиозаписи.
+        pk (int): Идентификатор записи текста в речь.
+
+    Returns:
+        str: Путь к созданному аудиофайлу.
+
+    """
+    fields = render_voice(text)
+    Text_to_speech.objects.filter(pk=pk, text=text).update(**fields)
+    return fields["voice"]
+
+
+@celery_app.task
+def flush_scheduled():
+    """
+    Синтезирует речь для записей, отложенное обновление которых уже пора выполнить.
+
+    Returns:
+        int: Количество обновленных записей.
+
+    """
+    return drain_scheduled()
+
+
+def render_voice(text):
+    """
+    Создает аудиофайл и возвращает значения полей записи для него.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+
+    Returns:
+        dict: Значения полей voice, voice_hash, ready и, при загрузке в S3, voice_key.
+
+    """
+    voice_hash, voice_path = write_voice(text)
+    fields = {"voice": voice_path, "voice_hash": voice_hash, "ready": True}
+    if settings.VOICE_S3_BUCKET:
+        fields["voice_key"] = upload_voice(voice_path)
+    return fields
+
+
+def schedule_synthesis(text, file_name, pk):
+    """
+    Откладывает синтез речи для записи на TTS_DEBOUNCE_DELAY секунд.
+
+    Повторные вызовы для той же записи в течение этого времени заменяют
+    текст и сдвигают срок, поэтому серия быстрых правок приводит к одному
+    синтезу и одному UPDATE.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+        file_name (str): Имя файла для аудиозаписи.
+        pk (int): Идентификатор записи текста в речь.
+
+    """
+    delay = settings.TTS_DEBOUNCE_DELAY
+    job = json.dumps({"text": text, "file_name": file_name, "pk": pk})
+    with get_redis().pipeline() as pipe:
+        pipe.set(PENDING_KEY.format(pk=pk), job, ex=PENDING_TIMEOUT)
+        pipe.zadd(SCHEDULE_KEY, {pk: time.time() + delay})
+        pipe.execute()
+
+    # В режиме пула отложенные задачи забирает tts_pool.
+    if not settings.TTS_POOL_ENABLED:
+        flush_scheduled.apply_async(countdown=delay)
+
+
+def drain_scheduled():
+    """
+    Забирает записи с наступившим сроком обновления, синтезирует для них речь
+    и сохраняет результат одним bulk_update.
+
+    Ошибка синтеза одной записи не мешает сохранить остальные: неудавшаяся
+    запись возвращается в расписание, пока не исчерпаны MAX_ATTEMPTS попыток.
+    Результат не сохраняется, если текст записи успел измениться, чтобы
+    более старая задача не перезаписала более новую.
+
+    Returns:
+        int: Количество обновленных записей.
+
+    """
+    redis = get_redis()
+    due = redis.zrangebyscore(SCHEDULE_KEY, 0, time.time())
+    # zrem защищает от двойной обработки, если обработчиков несколько.
+    pks = [int(pk) for pk in due if redis.zrem(SCHEDULE_KEY, pk)]
+    if not pks:
+        return 0
+
+    with redis.pipeline() as pipe:
+        for pk in pks:
+            pipe.get(PENDING_KEY.format(pk=pk))
+            pipe.delete(PENDING_KEY.format(pk=pk))
+        jobs = [json.loads(job) for job in pipe.execute()[::2] if job]
+
+    rendered = []
+    for job in jobs:
+        try:
+            rendered.append((job, render_voice(job["text"])))
+        except Exception:
+            logger.exception("Не удалось синтезировать речь для записи %s", job["pk"])
+            retry_scheduled(job)
+
+    if not rendered:
+        return 0
+
+    fields = ["voice", "voice_hash", "ready"]
+    if settings.VOICE_S3_BUCKET:
+        fields.append("voice_key")
+
+    with transaction.atomic():
+        current = dict(
+            Text_to_speech.objects.select_for_update()
+            .filter(pk__in=[job["pk"] for job, _ in rendered])
+            .values_list("pk", "text")
+        )
+        objs = [
+            Text_to_speech(pk=job["pk"], **values)
+            for job, values in rendered
+            if current.get(job["pk"]) == job["text"]
+        ]
+        Text_to_speech.objects.bulk_update(objs, fields)
+    return len(objs)
+
+
+def retry_scheduled(job):
+    """
+    Возвращает задачу отложенного синтеза в расписание после ошибки.
+
+    Если за это время пришла новая правка записи, остается ее текст и срок.
+
+    Args:
+        job (dict): Данные задачи: текст, имя файла, идентификатор записи и число попыток.
+
+    """
+    attempts = job.get("attempts", 0) + 1
+    if attempts >= MAX_ATTEMPTS:
+        logger.error(
+            "Синтез речи для записи %s не удался после %s попыток", job["pk"], attempts
+        )
+        return
+
+    delay = RETRY_DELAY * attempts
+    with get_redis().pipeline() as pipe:
+        pipe.set(
+            PENDING_KEY.format(pk=job["pk"]),
+            json.dumps({**job, "attempts": attempts}),
+            ex=PENDING_TIMEOUT,
+            nx=True,
+        )
+        pipe.zadd(SCHEDULE_KEY, {job["pk"]: time.time() + delay}, nx=True)
+        pipe.execute()
+
+    if not settings.TTS_POOL_ENABLED:
+        flush_scheduled.apply_async(countdown=delay)
+
+
+def enqueue_synthesis(text, file_name, pk, timeout=0):
+    """
+    Ставит синтез речи в очередь: в пул tts_pool, если он включен, иначе в Celery.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+        file_name (str): Имя файла для аудиозаписи.
+        pk (int): Идентификатор записи текста в речь.
+        timeout (float): Сколько секунд ждать результата из пула.
+
+    Returns:
+        tuple: Идентификатор задачи Celery (или None для пула) и признак готовности аудиофайла.
+
+    """
+    if not settings.TTS_POOL_ENABLED:
+        return synthesize.delay(text, file_name, pk).id, False
+
+    redis = get_redis()
+    job = json.dumps({"text": text, "file_name": file_name, "pk": pk})
+    if not timeout:
+        redis.rpush(POOL_KEY, job)
+        return None, False
+
+    # Подписываемся до постановки задачи, чтобы не пропустить ответ пула.
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(DONE_CHANNEL.format(pk=pk))
+    try:
+        redis.rpush(POOL_KEY, job)
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            if pubsub.get_message(timeout=remaining):
+                return None, True
+        return None, False
+    finally:
+        pubsub.close()
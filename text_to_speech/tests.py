@@ -0,0 +1,453 @@
+import json
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import fakeredis
+import fakeredis.aioredis
+from botocore.exceptions import ClientError
+from django.contrib.auth.models import User
+from django.test import TestCase, SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from . import storage, tasks, voice
+from .models import Text_to_speech
+from .management.commands import tts_pool
+
+
+def voice_fields(text):
+    return {"voice": f"voice/cache/{text}.mp3", "voice_hash": text, "ready": True}
+
+
+@override_settings(TTS_POOL_ENABLED=False, TTS_DEBOUNCE_DELAY=0, VOICE_S3_BUCKET=None)
+class DrainScheduledTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patchers = [
+            mock.patch.object(tasks, "get_redis", return_value=self.redis),
+            mock.patch.object(tasks.flush_scheduled, "apply_async"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create(self, text, file_name):
+        return Text_to_speech.objects.create(text=text, file_name=file_name)
+
+    def test_partial_failure_keeps_successful_rows_and_reschedules_failed(self):
+        first = self.create("first text here", "first")
+        second = self.create("second text here", "second")
+        tasks.schedule_synthesis(first.text, first.file_name, first.pk)
+        tasks.schedule_synthesis(second.text, second.file_name, second.pk)
+
+        def render(text):
+            if text == second.text:
+                raise RuntimeError("429 Too Many Requests")
+            return voice_fields(text)
+
+        with mock.patch.object(tasks, "render_voice", side_effect=render):
+            with self.assertLogs(tasks.logger, "ERROR"):
+                self.assertEqual(tasks.drain_scheduled(), 1)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(first.ready)
+        self.assertEqual(first.voice_hash, first.text)
+        self.assertFalse(second.ready)
+        self.assertIsNone(second.voice)
+
+        pending = json.loads(self.redis.get(tasks.PENDING_KEY.format(pk=second.pk)))
+        self.assertEqual(pending["text"], second.text)
+        self.assertEqual(pending["attempts"], 1)
+        self.assertIsNotNone(self.redis.zscore(tasks.SCHEDULE_KEY, second.pk))
+        self.assertIsNone(self.redis.zscore(tasks.SCHEDULE_KEY, first.pk))
+
+    def test_repeated_put_during_window_synthesizes_latest_text_once(self):
+        record = self.create("latest text here", "record")
+        tasks.schedule_synthesis("older text here", record.file_name, record.pk)
+        tasks.schedule_synthesis(record.text, record.file_name, record.pk)
+
+        with mock.patch.object(tasks, "render_voice", side_effect=voice_fields) as render:
+            self.assertEqual(tasks.drain_scheduled(), 1)
+            self.assertEqual(tasks.drain_scheduled(), 0)
+
+        render.assert_called_once_with(record.text)
+        record.refresh_from_db()
+        self.assertEqual(record.voice_hash, record.text)
+
+    def test_stale_job_does_not_overwrite_newer_text(self):
+        record = self.create("newer text here", "record")
+        tasks.schedule_synthesis("older text here", record.file_name, record.pk)
+
+        with mock.patch.object(tasks, "render_voice", side_effect=voice_fields):
+            self.assertEqual(tasks.drain_scheduled(), 0)
+
+        record.refresh_from_db()
+        self.assertIsNone(record.voice)
+
+
+class SplitSentencesTests(SimpleTestCase):
+    def test_short_sentences_are_merged(self):
+        self.assertEqual(
+            voice.split_sentences("Привет. Как дела? Хорошо!"),
+            ["Привет. Как дела? Хорошо!"],
+        )
+
+    def test_chunks_do_not_exceed_limit(self):
+        text = " ".join(f"Sentence number {i} is here." for i in range(40))
+
+        chunks = voice.split_sentences(text)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= voice.MAX_CHUNK_LENGTH for chunk in chunks))
+        self.assertEqual(" ".join(chunks), text)
+
+    def test_long_sentence_is_kept_whole(self):
+        long_sentence = "word " * 60 + "end."
+
+        self.assertEqual(
+            voice.split_sentences(f"Short. {long_sentence} Tail."),
+            ["Short.", long_sentence, "Tail."],
+        )
+
+
+@override_settings(VOICE_S3_BUCKET=None)
+class SynthesizeTaskTests(TestCase):
+    def test_slow_post_task_does_not_overwrite_newer_put(self):
+        record = Text_to_speech.objects.create(text="first text here", file_name="record")
+        # PUT меняет текст, отложенный синтез успевает раньше задачи от POST.
+        Text_to_speech.objects.filter(pk=record.pk).update(
+            text="second text here", **voice_fields("second text here")
+        )
+
+        with mock.patch.object(tasks, "render_voice", side_effect=voice_fields):
+            tasks.synthesize("first text here", record.file_name, record.pk)
+
+        record.refresh_from_db()
+        self.assertEqual(record.voice_hash, "second text here")
+        self.assertTrue(record.ready)
+
+    def test_result_is_saved_for_current_text(self):
+        record = Text_to_speech.objects.create(text="first text here", file_name="record")
+
+        with mock.patch.object(tasks, "render_voice", side_effect=voice_fields):
+            tasks.synthesize(record.text, record.file_name, record.pk)
+
+        record.refresh_from_db()
+        self.assertEqual(record.voice_hash, record.text)
+        self.assertTrue(record.ready)
+
+
+class AdminSaveTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        self.record = Text_to_speech.objects.create(
+            text="first text here", file_name="record", **voice_fields("first text here")
+        )
+        self.url = f"/admin/text_to_speech/text_to_speech/{self.record.pk}/change/"
+
+    def test_text_change_marks_record_not_ready_and_debounces(self):
+        with mock.patch("text_to_speech.admin.schedule_synthesis") as schedule, mock.patch(
+            "text_to_speech.admin.enqueue_synthesis"
+        ) as enqueue:
+            response = self.client.post(self.url, {"text": "second text here"})
+
+        self.assertEqual(response.status_code, 302)
+        self.record.refresh_from_db()
+        self.assertFalse(self.record.ready)
+        schedule.assert_called_once_with("second text here", "record", self.record.pk)
+        enqueue.assert_not_called()
+
+    def test_unchanged_text_keeps_voice(self):
+        with mock.patch("text_to_speech.admin.schedule_synthesis") as schedule:
+            self.client.post(self.url, {"text": self.record.text})
+
+        self.record.refresh_from_db()
+        self.assertTrue(self.record.ready)
+        schedule.assert_not_called()
+
+
+class VoiceCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.redis = fakeredis.FakeRedis()
+        patchers = [
+            mock.patch.object(voice, "VOICE_CACHE_DIR", self.cache_dir),
+            mock.patch.object(voice, "get_redis", return_value=self.redis),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_file(self, path):
+        with open(path, "wb") as f:
+            f.write(b"mp3")
+
+
+@override_settings(PIPER_VOICES={})
+class WriteVoiceTests(VoiceCacheTestCase):
+    def test_existing_file_is_reused(self):
+        h = voice.voice_hash("hello world", "en")
+        self.write_file(os.path.join(self.cache_dir, f"{h}.mp3"))
+
+        with mock.patch.object(voice, "synthesize_once") as synthesize_once:
+            self.assertEqual(voice.write_voice("hello world")[0], h)
+
+        synthesize_once.assert_not_called()
+
+    def test_existing_file_is_touched_for_lru_eviction(self):
+        path = os.path.join(self.cache_dir, f"{voice.voice_hash('hello world', 'en')}.mp3")
+        self.write_file(path)
+        os.utime(path, (0, 0))
+
+        with mock.patch.object(voice, "synthesize_once"):
+            voice.write_voice("hello world")
+
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_missing_file_is_synthesized(self):
+        with mock.patch.object(voice, "synthesize_once") as synthesize_once:
+            h, path = voice.write_voice("hello world")
+
+        synthesize_once.assert_called_once_with("hello world", "en", h, path)
+
+
+@override_settings(PIPER_VOICES={})
+class SynthesizeToTests(VoiceCacheTestCase):
+    def test_cached_file_is_world_readable(self):
+        path = os.path.join(self.cache_dir, "abc.mp3")
+
+        def write_gtts(text, lang, f):
+            f.write(b"mp3")
+
+        with mock.patch.object(voice, "write_gtts", side_effect=write_gtts):
+            voice.synthesize_to("hello world", "en", path)
+
+        self.assertEqual(os.stat(path).st_mode & 0o777, voice.VOICE_FILE_MODE)
+        self.assertEqual(os.listdir(self.cache_dir), ["abc.mp3"])
+
+
+class SynthesizeOnceTests(VoiceCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.h = "abc"
+        self.path = os.path.join(self.cache_dir, "abc.mp3")
+        self.lock_key = voice.VOICE_LOCK_KEY.format(hash=self.h)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(voice.VOICE_READY_CHANNEL.format(hash=self.h))
+        self.addCleanup(self.pubsub.close)
+
+    def published(self):
+        deadline = time.monotonic() + 0.2
+        while time.monotonic() < deadline:
+            if self.pubsub.get_message(timeout=0.05):
+                return True
+        return False
+
+    def test_holder_synthesizes_releases_lock_and_publishes(self):
+        with mock.patch.object(
+            voice, "synthesize_to", side_effect=lambda *args: self.write_file(self.path)
+        ) as synthesize_to:
+            voice.synthesize_once("text", "en", self.h, self.path)
+
+        synthesize_to.assert_called_once()
+        self.assertIsNone(self.redis.get(self.lock_key))
+        self.assertTrue(self.published())
+
+    def test_holder_failure_releases_lock_without_publishing(self):
+        with mock.patch.object(voice, "synthesize_to", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                voice.synthesize_once("text", "en", self.h, self.path)
+
+        self.assertIsNone(self.redis.get(self.lock_key))
+        self.assertFalse(self.published())
+
+    def test_holder_does_not_release_lock_taken_by_another_process(self):
+        def expire_and_steal(*args):
+            self.redis.set(self.lock_key, "other")
+
+        with mock.patch.object(voice, "synthesize_to", side_effect=expire_and_steal):
+            voice.synthesize_once("text", "en", self.h, self.path)
+
+        self.assertEqual(self.redis.get(self.lock_key), b"other")
+
+    def test_waiter_uses_file_published_by_holder(self):
+        self.redis.set(self.lock_key, "other")
+
+        def holder():
+            time.sleep(0.1)
+            self.write_file(self.path)
+            self.redis.publish(voice.VOICE_READY_CHANNEL.format(hash=self.h), self.path)
+
+        thread = threading.Thread(target=holder)
+        thread.start()
+        self.addCleanup(thread.join)
+        with mock.patch.object(voice, "synthesize_to") as synthesize_to:
+            voice.synthesize_once("text", "en", self.h, self.path)
+
+        synthesize_to.assert_not_called()
+
+    def test_waiter_does_not_wait_for_file_finished_before_subscribing(self):
+        self.redis.set(self.lock_key, "other")
+        self.write_file(self.path)
+
+        started = time.monotonic()
+        with mock.patch.object(voice, "synthesize_to") as synthesize_to:
+            voice.synthesize_once("text", "en", self.h, self.path)
+
+        self.assertLess(time.monotonic() - started, 1)
+        synthesize_to.assert_not_called()
+
+    def test_waiter_falls_back_when_holder_never_finishes(self):
+        self.redis.set(self.lock_key, "other")
+
+        with mock.patch.object(voice, "VOICE_WAIT_TIMEOUT", 0.1), mock.patch.object(
+            voice, "synthesize_to"
+        ) as synthesize_to:
+            voice.synthesize_once("text", "en", self.h, self.path)
+
+        synthesize_to.assert_called_once_with("text", "en", self.path)
+
+
+@override_settings(VOICE_S3_BUCKET="voices")
+class UploadVoiceTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(storage, "get_s3_client")
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_existing_object_is_not_uploaded_again(self):
+        self.assertEqual(storage.upload_voice("voice/cache/abc.mp3"), "voice/cache/abc.mp3")
+
+        self.client.upload_file.assert_not_called()
+
+    def test_missing_object_is_uploaded(self):
+        self.client.head_object.side_effect = ClientError(
+            {"Error": {"Code": "404"}}, "HeadObject"
+        )
+
+        storage.upload_voice("voice/cache/abc.mp3")
+
+        self.client.upload_file.assert_called_once_with(
+            "voice/cache/abc.mp3",
+            "voices",
+            "voice/cache/abc.mp3",
+            ExtraArgs={"ContentType": "audio/mpeg"},
+        )
+
+
+class TextToSpeechValidationTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user("user"))
+        patcher = mock.patch("text_to_speech.views.enqueue_synthesis")
+        self.enqueue_synthesis = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalid_fields_are_reported_per_field(self):
+        response = self.client.post(
+            "/api/text-to-speech/", {"text": "short", "file_name": "ab"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data,
+            {
+                "text": ["Текст не может быть меньше 10 символов."],
+                "file_name": ["Имя файла не может быть меньше 5 символов."],
+            },
+        )
+        self.enqueue_synthesis.assert_not_called()
+
+    def test_missing_fields_are_reported_in_russian(self):
+        response = self.client.post("/api/text-to-speech/", {})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["text"], ["Текст не может быть пустым."])
+        self.assertEqual(response.data["file_name"], ["Имя файла не может быть пустым."])
+
+    def test_duplicate_file_name_is_rejected(self):
+        Text_to_speech.objects.create(text="hello world", file_name="hello")
+
+        response = self.client.post(
+            "/api/text-to-speech/", {"text": "hello again", "file_name": "hello"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file_name", response.data)
+        self.enqueue_synthesis.assert_not_called()
+
+
+@override_settings(VOICE_ACCEL_REDIRECT_PREFIX=None, VOICE_X_SENDFILE=False)
+class DownloadVoiceTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user("user"))
+        fd, path = tempfile.mkstemp(suffix=".mp3")
+        os.write(fd, b"mp3")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        Text_to_speech.objects.create(
+            text="hello world", file_name="hello", voice=path, voice_hash="abc", ready=True
+        )
+
+    def test_download_sets_etag_and_cache_control(self):
+        response = self.client.get("/api/download-voice/hello/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], '"abc"')
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("private", response["Cache-Control"])
+        response.close()
+
+    def test_matching_if_none_match_returns_304(self):
+        response = self.client.get("/api/download-voice/hello/", HTTP_IF_NONE_MATCH='"abc"')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], '"abc"')
+        self.assertIn("no-cache", response["Cache-Control"])
+
+
+@override_settings(TTS_POOL_ENABLED=True)
+class PoolTests(SimpleTestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server)
+        self.aredis = fakeredis.aioredis.FakeRedis(server=server)
+        patcher = mock.patch.object(tasks, "get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.command = tts_pool.Command(stderr=mock.Mock())
+
+    def run_pool_job(self):
+        async def run():
+            (raw_job,) = await self.command.drain(self.aredis)
+            with tts_pool.ThreadPoolExecutor(max_workers=1) as pool:
+                await self.command.run_job(
+                    self.aredis, pool, asyncio.Semaphore(1), raw_job
+                )
+
+        asyncio.run(run())
+
+    def test_failed_job_is_rescheduled(self):
+        job = {"text": "hello world", "file_name": "hello", "pk": 1}
+        self.redis.rpush(tasks.POOL_KEY, json.dumps(job))
+
+        with mock.patch.object(self.command, "synthesize", side_effect=RuntimeError):
+            self.run_pool_job()
+
+        pending = json.loads(self.redis.get(tasks.PENDING_KEY.format(pk=1)))
+        self.assertEqual(pending, {**job, "attempts": 1})
+        self.assertIsNotNone(self.redis.zscore(tasks.SCHEDULE_KEY, 1))
+        self.assertEqual(self.redis.llen(tts_pool.PROCESSING_KEY), 0)
+
+    def test_job_stays_in_processing_list_until_finished(self):
+        self.redis.rpush(tasks.POOL_KEY, json.dumps({"pk": 1}))
+
+        jobs = asyncio.run(self.command.drain(self.aredis))
+
+        self.assertEqual(self.redis.llen(tasks.POOL_KEY), 0)
+        self.assertEqual(self.redis.lrange(tts_pool.PROCESSING_KEY, 0, -1), jobs)
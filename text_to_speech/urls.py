@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
-    TextToSpeechView, TextToSpeechDetailView, DownloadVoiceView, CreateUserView, CustomObtainAuthToken
+    TextToSpeechView, TextToSpeechDetailView, DownloadVoiceView, CreateUserView, CustomObtainAuthToken,
+    SynthesisStatusView
 )
 
 
@@ -11,5 +12,6 @@ urlpatterns = [
     path('register/', CreateUserView.as_view(), name='create_user'),
     path('text-to-speech/', TextToSpeechView.as_view(), name='text-to-speech-list'),
     path('text-to-speech/<int:pk>/', TextToSpeechDetailView.as_view(), name='text-to-speech-detail'),
+    path('text-to-speech/tasks/<str:task_id>/', SynthesisStatusView.as_view(), name='text-to-speech-task'),
     path('download-voice/<str:file_name>/', DownloadVoiceView.as_view(), name='download-voice'),
 ]
@@ -1,27 +1,35 @@
-import io
-import re
+import os
 
-from gtts import gTTS
+from celery.result import AsyncResult
+from django.conf import settings
+from django.db import IntegrityError
 from django.utils import timezone
-from django.http import FileResponse
+from django.utils.http import quote_etag
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
-from django.core.exceptions import ValidationError
 
 from rest_framework import serializers
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.pagination import LimitOffsetPagination
+
+from EndyFlay.celery import celery_app
 
 from .models import Text_to_speech
+from .tasks import enqueue_synthesis, schedule_synthesis
+from .voice import VOICE_DIR
+from .storage import voice_url
 from .serializers import TextToSpeechSerializer, UserSerializer
 
 
-MIN_TEXT_LENGTH = 10
-MIN_FILE_NAME_LENGTH = 5
-MAX_TEXT_LENGTH = 700
-MAX_FILE_NAME_LENGTH = 20
+class TextToSpeechPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
 
 
 class CustomObtainAuthToken(ObtainAuthToken):
@@ -62,8 +70,10 @@ class CustomObtainAuthToken(ObtainAuthToken):
                 }
             )
         else:
-            token.created = timezone.now()
-            token.save()
+            # Обновляем дату токена не чаще раза в TOKEN_REFRESH_INTERVAL секунд.
+            now = timezone.now()
+            if (now - token.created).total_seconds() > settings.TOKEN_REFRESH_INTERVAL:
+                Token.objects.filter(pk=token.pk).update(created=now)
             return Response(
                 {
                     "token": token.key,
@@ -117,58 +127,12 @@ class BaseTextToSpeechView(generics.GenericAPIView):
         serializer_class (Type[Serializer]): Класс сериализатора, используемый для преобразования данных.
         permission_classes (List[Type[BasePermission]]): Список классов разрешений, определяющих, кто может выполнять операции.
 
-    Methods:
-        validate_request_data(text: str, file_name: str) -> None:
-            Проверяет данные запроса на соответствие заданным правилам.
-
-    Raises:
-        serializers.ValidationError: Вызывается, если данные запроса не прошли валидацию.
-
     """
 
     queryset = Text_to_speech.objects.all()
     serializer_class = TextToSpeechSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def validate_request_data(self, text, file_name):
-        """
-        Проверяет данные запроса на соответствие заданным правилам.
-
-        Args:
-            text (str): Текст, который нужно преобразовать в речь.
-            file_name (str): Имя файла для аудиозаписи.
-
-        Raises:
-            serializers.ValidationError: Вызывается, если данные запроса не прошли валидацию.
-
-        """
-        if not text:
-            raise serializers.ValidationError({"error": "Текст не может быть пустым."})
-        elif len(text) < MIN_TEXT_LENGTH:
-            raise serializers.ValidationError(
-                {"error": f"Текст не может быть меньше {MIN_TEXT_LENGTH} символов."}
-            )
-        elif not file_name:
-            raise serializers.ValidationError(
-                {"error": "Имя файла не может быть пустым."}
-            )
-        elif len(file_name) < MIN_FILE_NAME_LENGTH:
-            raise serializers.ValidationError(
-                {
-                    "error": f"Имя файла не может быть меньше {MIN_FILE_NAME_LENGTH} символов."
-                }
-            )
-        elif len(text) > MAX_TEXT_LENGTH:
-            raise serializers.ValidationError(
-                {"error": f"Текст не может быть больше {MAX_TEXT_LENGTH} символов."}
-            )
-        elif len(file_name) > MAX_FILE_NAME_LENGTH:
-            raise serializers.ValidationError(
-                {
-                    "error": f"Имя файла не может быть больше {MAX_FILE_NAME_LENGTH} символов."
-                }
-            )
-
 
 class TextToSpeechView(BaseTextToSpeechView, generics.ListCreateAPIView):
     """
@@ -178,37 +142,26 @@ class TextToSpeechView(BaseTextToSpeechView, generics.ListCreateAPIView):
         ...
 
     Methods:
-        user_text(file_name: str, text: str) -> str:
-            Создает аудиофайл на основе переданного текста и имени файла.
+        get_queryset() -> QuerySet:
+            Возвращает постраничный список записей только с нужными для списка полями.
         post(request: Request, *args, **kwargs) -> Response:
             Обрабатывает HTTP POST-запрос для создания новой записи текста в речь.
 
     """
 
-    def user_text(self, file_name, text, *args, **kwargs):
-        """
-        Создает аудиофайл на основе переданного текста и имени файла.
+    pagination_class = TextToSpeechPagination
 
-        Args:
-            file_name (str): Имя файла для аудиозаписи.
-            text (str): Текст, который нужно преобразовать в речь.
+    def get_queryset(self):
+        """
+        Возвращает постраничный список записей только с нужными для списка полями.
 
         Returns:
-            str: Путь к созданному аудиофайлу.
+            QuerySet: Набор записей текста в речь, отсортированный от новых к старым.
 
         """
-        match = re.search(r"[\u0400-\u04ff]|[\u0500-\u052f]", text)
-        lang = "ru" if match else "en"
-        tts = gTTS(text=text, lang=lang)
-        voice_bytes = io.BytesIO()
-        tts.write_to_fp(voice_bytes)
-        voice_bytes.seek(0)
-
-        voice_path = f"voice/{file_name}.mp3"
-        with open(voice_path, "wb") as f:
-            f.write(voice_bytes.read())
-
-        return voice_path
+        return Text_to_speech.objects.only("id", "text", "file_name", "ready").order_by(
+            "-id"
+        )
 
     def post(self, request, *args, **kwargs):
         """
@@ -218,21 +171,29 @@ class TextToSpeechView(BaseTextToSpeechView, generics.ListCreateAPIView):
             request (Request): Запрос, содержащий данные о тексте и имени файла.
 
         Returns:
-            Response: Ответ на запрос.
+            Response: Ответ на запрос с идентификатором задачи синтеза.
 
         """
         # Реализация обработки POST-запроса
-        text = request.data.get("text")
-        file_name = request.data.get("file_name")
-
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         try:
-            self.validate_request_data(text, file_name)
-        except ValidationError as e:
-            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            voice_path = self.user_text(file_name, text)
-            request.data["voice"] = voice_path
-            return super().post(request, *args, **kwargs)
+            text_to_speech = serializer.save()
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {"file_name": ["Запись с таким именем файла уже существует."]}
+            )
+
+        task_id, ready = enqueue_synthesis(
+            text_to_speech.text,
+            text_to_speech.file_name,
+            text_to_speech.pk,
+            timeout=settings.TTS_POOL_TIMEOUT,
+        )
+        return Response(
+            {"task_id": task_id, "pk": text_to_speech.pk},
+            status=status.HTTP_201_CREATED if ready else status.HTTP_202_ACCEPTED,
+        )
 
 
 class TextToSpeechDetailView(
@@ -245,19 +206,35 @@ class TextToSpeechDetailView(
         ...
 
     Methods:
-        update_voice(file_name: str, text: str) -> None:
-            Обновляет аудиофайл на основе переданного текста и имени файла.
-        put(request: Request, *args, **kwargs) -> Response:
-            Обрабатывает HTTP PUT-запрос для обновления записи текста в речь.
+        get_object() -> Text_to_speech:
+            Возвращает запись текста в речь, запрашивая ее из базы данных один раз за запрос.
+        update_voice(text_to_speech: Text_to_speech, text: str) -> None:
+            Откладывает обновление аудиофайла на основе переданного текста.
+        perform_update(serializer: Serializer) -> None:
+            Сохраняет изменения записи текста в речь и обновляет аудиофайл.
 
     """
 
-    def update_voice(self, file_name, text):
+    def get_object(self):
+        """
+        Возвращает запись текста в речь, запрашивая ее из базы данных один раз за запрос.
+
+        Returns:
+            Text_to_speech: Запись текста в речь.
+
+        """
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+    def update_voice(self, text_to_speech, text):
         """
-        Обновляет аудиофайл на основе переданного текста и имени файла.
+        Откладывает обновление аудиофайла на основе переданного текста.
+
+        Быстрые повторные правки одной записи объединяются в один синтез.
 
         Args:
-            file_name (str): Имя файла для аудиозаписи.
+            text_to_speech (Text_to_speech): Запись текста в речь.
             text (str): Текст, который нужно преобразовать в речь.
 
         Returns:
@@ -265,39 +242,59 @@ class TextToSpeechDetailView(
 
         """
         # Реализация обновления аудиофайла
-        voice_path = self.user_text(file_name, text)
-
-        self.get_object().voice = voice_path
-        self.get_object().save()
+        schedule_synthesis(text, text_to_speech.file_name, text_to_speech.pk)
 
-    def put(self, request, *args, **kwargs):
+    def perform_update(self, serializer):
         """
-        Обрабатывает HTTP PUT-запрос для обновления записи текста в речь.
+        Сохраняет изменения записи текста в речь и обновляет аудиофайл.
 
         Args:
-            request (Request): Запрос, содержащий данные о тексте и имени файла.
+            serializer (Serializer): Проверенный сериализатор записи.
 
         Returns:
-            Response: Ответ на запрос.
+            None
 
         """
-        # Реализация обработки PUT-запроса
-        text = request.data.get("text")
-        file_name = request.data.get("file_name")
+        # Старый аудиофайл не соответствует новому тексту до повторного синтеза.
+        text_to_speech = serializer.save(ready=False)
+        self.update_voice(text_to_speech, text_to_speech.text)
 
-        try:
-            self.validate_request_data(text, file_name)
-        except ValidationError as e:
-            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
 
-        if self.get_object().created_at is not None:
-            raise serializers.MethodNotAllowed("PUT")
+class SynthesisStatusView(APIView):
+    """
+    Класс SynthesisStatusView обрабатывает запросы на получение статуса задачи синтеза речи.
 
-        response = super().put(request, *args, **kwargs)
+    Attributes:
+        permission_classes (List[Type[BasePermission]]): Список классов разрешений, определяющих, кто может выполнять операции.
 
-        self.update_voice(file_name, text)
+    Methods:
+        get(request: Request, task_id: str, *args, **kwargs) -> Response:
+            Обрабатывает HTTP GET-запрос для получения статуса задачи.
 
-        return response
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, task_id, *args, **kwargs):
+        """
+        Обрабатывает HTTP GET-запрос для получения статуса задачи.
+
+        Args:
+            request (Request): Запрос на получение статуса задачи.
+            task_id (str): Идентификатор задачи синтеза.
+
+        Returns:
+            Response: Ответ на запрос со статусом задачи.
+
+        """
+        result = AsyncResult(task_id, app=celery_app)
+        return Response(
+            {
+                "task_id": task_id,
+                "status": result.status,
+                "ready": result.ready(),
+            }
+        )
 
 
 class DownloadVoiceView(generics.RetrieveAPIView):
@@ -316,7 +313,9 @@ class DownloadVoiceView(generics.RetrieveAPIView):
 
     """
 
-    queryset = Text_to_speech.objects.all()
+    queryset = Text_to_speech.objects.only(
+        "voice", "voice_key", "voice_hash", "file_name", "ready"
+    )
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = "file_name"
 
@@ -334,9 +333,44 @@ class DownloadVoiceView(generics.RetrieveAPIView):
         """
         # Реализация скачивания аудиофайла
         text_to_speech = get_object_or_404(self.get_queryset(), file_name=file_name)
+        if not text_to_speech.ready:
+            return Response(
+                {"error": "Аудиофайл еще не готов."}, status=status.HTTP_409_CONFLICT
+            )
+
+        if text_to_speech.voice_key:
+            return HttpResponseRedirect(
+                voice_url(text_to_speech.voice_key, text_to_speech.file_name)
+            )
+
+        # Повторное скачивание неизменившегося файла завершается ответом 304.
+        etag = text_to_speech.voice_hash and quote_etag(text_to_speech.voice_hash)
+        if etag:
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                response["ETag"] = etag
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+
         voice_path = text_to_speech.voice
-        response = FileResponse(open(voice_path, "rb"))
+        accel_prefix = settings.VOICE_ACCEL_REDIRECT_PREFIX
+        if accel_prefix:
+            # Отдачу файла берет на себя nginx через sendfile.
+            response = HttpResponse(content_type="audio/mpeg")
+            response["X-Accel-Redirect"] = accel_prefix + os.path.relpath(
+                voice_path, VOICE_DIR
+            )
+        elif settings.VOICE_X_SENDFILE:
+            # Отдачу файла берет на себя Apache (mod_xsendfile) или lighttpd.
+            response = HttpResponse(content_type="audio/mpeg")
+            response["X-Sendfile"] = os.path.abspath(voice_path)
+        else:
+            # Под gunicorn wsgi.file_wrapper отправляет файл через os.sendfile.
+            response = FileResponse(open(voice_path, "rb"), content_type="audio/mpeg")
         response[
             "Content-Disposition"
         ] = f'attachment; filename="{text_to_speech.file_name}.mp3"'
+        if etag:
+            response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
         return response
@@ -0,0 +1,326 @@
+import io
+import os
+import re
+import json
+import time
+import uuid
+import types
+import hashlib
+import tempfile
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+import gtts.tts
+import requests
+from gtts import gTTS
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .redis_client import get_redis
+
+
+VOICE_DIR = "voice"
+VOICE_CACHE_DIR = os.path.join(VOICE_DIR, "cache")
+VOICE_LOCK_KEY = "tts:lock:{hash}"
+VOICE_READY_CHANNEL = "tts:ready:{hash}"
+VOICE_LOCK_TIMEOUT = 60
+VOICE_WAIT_TIMEOUT = 30
+WRITE_BUFFER_SIZE = 64 * 1024
+VOICE_FILE_MODE = 0o644
+
+MAX_CHUNK_LENGTH = 200
+CHUNK_WORKERS = 8
+PIPER_MP3_BIT_RATE = 64
+
+_CYRILLIC_RE = re.compile(r"[\u0400-\u052f]")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+_chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS)
+
+# Снимает блокировку, только если она все еще принадлежит этому процессу.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class _KeepAliveSession(requests.Session):
+    """
+    Сессия requests, которую gTTS не закрывает после каждого запроса,
+    чтобы TLS-соединения с Google переиспользовались.
+    """
+
+    def __exit__(self, *args):
+        pass
+
+
+# gTTS создает новую requests.Session на каждый запрос, поэтому подменяем
+# модуль requests, который видит gtts.tts, на копию с общей сессией.
+_session = _KeepAliveSession()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_gtts_requests = types.ModuleType("requests")
+_gtts_requests.__dict__.update(vars(requests))
+_gtts_requests.Session = lambda: _session
+gtts.tts.requests = _gtts_requests
+
+
+def detect_language(text):
+    """
+    Определяет язык текста: русский при наличии кириллицы, иначе английский.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+
+    Returns:
+        str: Код языка для gTTS.
+
+    """
+    return "ru" if _CYRILLIC_RE.search(text) else "en"
+
+
+def split_sentences(text):
+    """
+    Делит текст на части не длиннее MAX_CHUNK_LENGTH символов по границам предложений.
+
+    Предложение длиннее предела остается отдельной частью: его разобьет сам gTTS.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+
+    Returns:
+        list: Части текста в исходном порядке.
+
+    """
+    chunks = []
+    for sentence in _SENTENCE_END_RE.split(text.strip()):
+        if chunks and len(chunks[-1]) + len(sentence) < MAX_CHUNK_LENGTH:
+            chunks[-1] = f"{chunks[-1]} {sentence}"
+        else:
+            chunks.append(sentence)
+    return chunks
+
+
+def voice_hash(text, lang):
+    """
+    Вычисляет ключ кэша аудиофайла по языку и тексту.
+
+    Для языков, озвучиваемых локальной моделью Piper, в ключ входит путь
+    к модели, чтобы смена модели не отдавала старые файлы из кэша.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+        lang (str): Код языка.
+
+    Returns:
+        str: SHA-256 в шестнадцатеричном виде.
+
+    """
+    model_path = settings.PIPER_VOICES.get(lang)
+    key = f"{model_path}\0{lang}\0{text}" if model_path else f"{lang}\0{text}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def piper_voice(lang):
+    """
+    Загружает локальную модель Piper для языка один раз на процесс.
+
+    Args:
+        lang (str): Код языка.
+
+    Returns:
+        PiperVoice: Модель Piper или None, если для языка используется gTTS.
+
+    """
+    model_path = settings.PIPER_VOICES.get(lang)
+    if not model_path:
+        return None
+
+    # Piper и onnxruntime нужны только при настроенных моделях.
+    import onnxruntime
+    from piper import PiperVoice
+    from piper.config import PiperConfig
+
+    with open(f"{model_path}.json", encoding="utf-8") as f:
+        config = PiperConfig.from_dict(json.load(f))
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = settings.PIPER_THREADS
+    session = onnxruntime.InferenceSession(
+        model_path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+    return PiperVoice(session=session, config=config)
+
+
+def write_voice(text):
+    """
+    Создает аудиофайл на основе переданного текста.
+
+    Файлы хранятся по хэшу языка и текста, поэтому повторяющиеся тексты
+    не синтезируются заново, а записи с одинаковым текстом ссылаются
+    на один и тот же файл. Имя файла для скачивания задается отдельно.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+
+    Returns:
+        tuple: Хэш языка и текста и путь к аудиофайлу в каталоге кэша.
+
+    """
+    lang = detect_language(text)
+    h = voice_hash(text, lang)
+    cache_path = os.path.join(VOICE_CACHE_DIR, f"{h}.mp3")
+
+    # Наличие файла проверяется только по диску: воркеры могут работать на разных
+    # хостах, а trim_voice_cache может удалить файл в любой момент. utime заодно
+    # обновляет mtime, чтобы trim_voice_cache вытеснял давно не использованные файлы.
+    try:
+        os.utime(cache_path)
+    except FileNotFoundError:
+        synthesize_once(text, lang, h, cache_path)
+
+    return h, cache_path
+
+
+def synthesize_once(text, lang, h, cache_path):
+    """
+    Синтезирует аудиофайл, не допуская параллельного синтеза одного и того же текста.
+
+    Первый процесс захватывает блокировку в Redis и синтезирует речь, остальные
+    ждут его сигнала и используют готовый файл. Сигнал отправляется только
+    после успешного синтеза; если его нет за отведенное время (владелец
+    блокировки упал или получил ошибку), файл синтезируется локально.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+        lang (str): Код языка.
+        h (str): Хэш языка и текста.
+        cache_path (str): Путь к аудиофайлу в каталоге кэша.
+
+    """
+    redis = get_redis()
+    lock_key = VOICE_LOCK_KEY.format(hash=h)
+    channel = VOICE_READY_CHANNEL.format(hash=h)
+
+    token = uuid.uuid4().hex
+    if redis.set(lock_key, token, nx=True, ex=VOICE_LOCK_TIMEOUT):
+        try:
+            synthesize_to(text, lang, cache_path)
+        finally:
+            redis.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        redis.publish(channel, cache_path)
+        return
+
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(channel)
+    try:
+        # Файл мог появиться до подписки на канал.
+        deadline = time.monotonic() + VOICE_WAIT_TIMEOUT
+        while not os.path.exists(cache_path):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or pubsub.get_message(timeout=remaining):
+                break
+    finally:
+        pubsub.close()
+
+    if not os.path.exists(cache_path):
+        synthesize_to(text, lang, cache_path)
+
+
+def synthesize_to(text, lang, cache_path):
+    """
+    Синтезирует речь и атомарно сохраняет ее в файл.
+
+    Если для языка настроена модель Piper, речь синтезируется локально,
+    иначе через gTTS.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+        lang (str): Код языка.
+        cache_path (str): Путь к аудиофайлу в каталоге кэша.
+
+    """
+    voice = piper_voice(lang)
+
+    os.makedirs(VOICE_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=VOICE_CACHE_DIR, suffix=".tmp")
+    # mkstemp создает файл с правами 0600, а nginx и Apache читают кэш
+    # от имени другого пользователя.
+    os.fchmod(fd, VOICE_FILE_MODE)
+    try:
+        with os.fdopen(fd, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            if voice is not None:
+                write_piper(voice, text, f)
+            else:
+                write_gtts(text, lang, f)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, cache_path)
+
+
+def write_piper(voice, text, f):
+    """
+    Синтезирует речь локальной моделью Piper и кодирует ее в MP3.
+
+    Piper выдает PCM по предложениям, поэтому MP3 записывается в файл по мере синтеза.
+
+    Args:
+        voice (PiperVoice): Модель Piper.
+        text (str): Текст, который нужно преобразовать в речь.
+        f (file): Файл для записи MP3.
+
+    """
+    import lameenc
+
+    encoder = lameenc.Encoder()
+    encoder.set_bit_rate(PIPER_MP3_BIT_RATE)
+    encoder.set_in_sample_rate(voice.config.sample_rate)
+    encoder.set_channels(1)
+    encoder.set_quality(2)
+    for pcm in voice.synthesize_stream_raw(text):
+        f.write(encoder.encode(pcm))
+    f.write(encoder.flush())
+
+
+def write_gtts(text, lang, f):
+    """
+    Синтезирует речь через gTTS.
+
+    Длинный текст делится на предложения, которые синтезируются параллельно.
+
+    Args:
+        text (str): Текст, который нужно преобразовать в речь.
+        lang (str): Код языка.
+        f (file): Файл для записи MP3.
+
+    """
+    chunks = split_sentences(text)
+    if len(chunks) == 1:
+        gTTS(text=text, lang=lang).write_to_fp(f)
+        return
+
+    # MP3-кадры можно склеивать, поэтому части синтезируются параллельно
+    # и записываются в исходном порядке.
+    for voice_bytes in _chunk_executor.map(
+        synthesize_chunk, chunks, [lang] * len(chunks)
+    ):
+        f.write(voice_bytes)
+
+
+def synthesize_chunk(text, lang):
+    """
+    Синтезирует одну часть текста в память.
+
+    Args:
+        text (str): Часть текста.
+        lang (str): Код языка.
+
+    Returns:
+        bytes: MP3-данные части.
+
+    """
+    voice_bytes = io.BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(voice_bytes)
+    return voice_bytes.getvalue()